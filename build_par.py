@@ -1,10 +1,13 @@
-import gspread
-import argparse
+import sys
+import os
+import hashlib
+import tempfile
 import pdb
 
-from oauth2client.service_account import ServiceAccountCredentials
-
 from datetime import datetime
+from collections import defaultdict, Counter
+from functools import lru_cache
+from operator import itemgetter
 
 # Some standard formatting to use throughout
 newline = "\\\\ \n"
@@ -13,6 +16,8 @@ doubleblank = "\n\n"
 emph_none = "\emph{none}"
 
 date_fmt = "%m/%d/%y"
+month_names = ('January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December')
 
 table_single_rule = " \\\\ \hline"
 table_double_rule = table_single_rule + "\hline"
@@ -20,13 +25,76 @@ table_footer = "\\end{tabular}\n\\end{centering}"
 bind_page_start = "\\noindent\\begin{minipage}{\\textwidth}\n"
 bind_page_end = "\n\\end{minipage}\n"
 
-grantlist_column_info = [("Begin Date",0.1,'STARTDATE'),
-                   ("End Date",0.1,'ENDDATE'),
-                   ("Amount [\$k]",0.1,'AMOUNT'),
-                   ("Topic",0.3,'TOPIC'),
-                   ("Agency",0.1,'AGENCY'),
-                   ("Co-Authors",0.1,'CO-AUTHORS'),
-                   ("Role",0.05,'ROLE')]
+# the fixed LaTeX around the body of the report; only the year is added per report
+par_preamble = """\
+\\documentclass[12pt]{article}
+
+\\usepackage{ep_par}
+"""
+par_begin_document = """\
+\\newcommand{\\parperson}{Paul P.\\ H.\\ Wilson}
+\\begin{document}
+
+\\partitle
+"""
+par_end_document = "\\end{document}\n"
+
+# every worksheet that contributes to the report
+par_worksheets = ['CourseHistory', 'CourseInfo', 'CourseDevelopment',
+                  'AdviseeList', 'StudentOrgAdvising', 'StudentOrgList',
+                  'Service', 'ServiceList', 'Reviews', 'ReviewSource',
+                  'OtherStudentCommittees', 'Outreach', 'HonorsAwards', 'Patents',
+                  'ProposalsAndGrants', 'Consulting', 'Meetings',
+                  'ActiveResearchStudents', 'Staff', 'PersonalResearch',
+                  'ClimateImprovement', 'ImportantActivities',
+                  'SignificantAccomplishments']
+
+# worksheets that are only used to look up details by a code, and that code
+catalog_worksheets = {'StudentOrgList' : 'ORGCODE',
+                      'ReviewSource' : 'SOURCE',
+                      'ServiceList' : 'SERVICECODE'}
+
+# advisee types that count as graduate students doing research
+grad_student_types = frozenset({'G', 'V'})
+
+# staff titles reported as research staff and as undergraduate researchers
+prof_positions = frozenset({'Scientist', 'Researcher', 'Academic Staff'})
+ug_positions = frozenset({'U/G Hourly'})
+
+# map the database column names to the LaTeX table headers and widths:
+# (header, relative column width, record key) for each column, in order
+course_column_info = (("Semester",0.25,''),
+                      ("Course",0.25,'COURSEID'),
+                      ("\# of Students",0.25,'STUDENTS'),
+                      ("Role",0.25,'ROLE'))
+
+grantlist_column_info = (("Begin Date",0.1,'STARTDATE'),
+                         ("End Date",0.1,'ENDDATE'),
+                         ("Amount [\$k]",0.1,'AMOUNT'),
+                         ("Topic",0.3,'TOPIC'),
+                         ("Agency",0.1,'AGENCY'),
+                         ("Co-Authors",0.1,'CO-AUTHORS'),
+                         ("Role",0.05,'ROLE'))
+
+meeting_column_info = (("Dates",0.15,'DATERANGE'),
+                       ("Location",0.2,'LOCATION'),
+                       ("Meeting",0.55,'MEETINGNAME'))
+
+research_student_column_info = (("Student",0.25,'FULLNAME'),
+                                ("Program",0.11,'DEGREE'),
+                                ("Research Topic",0.35,'TOPIC'),
+                                ("Source of Support",0.2,'SOURCE'))
+
+graduated_student_column_info = (("Student",0.3,'FULLNAME'),
+                                 ("Program",0.15,'DEGREE'),
+                                 ("Date",0.15,'DEFENSEDATE'),
+                                 ("Employer",0.3,'CURRENTEMPLOYER'))
+
+staff_column_info = (("Name", 0.25,'FULLNAME'),
+                     ("Title",0.11,'TITLE'),
+                     ("Research Topic",0.35,'TOPIC'),
+                     ("Source of Support",0.2,'SUPPORT'))
+
  
 def section_sep(title):
     """
@@ -60,17 +128,34 @@ def heading(section, guidance=""):
     head_str : (str) formatted section heading and guidance
     """
 
-    head_str = "\section{" + section + "}" + doubleblank
+    head_str = f"\\section{{{section}}}{doubleblank}"
     if len(guidance) > 0:
-        head_str += "\emph{(" + guidance + ")}" + doubleblank
+        head_str += f"\\emph{{({guidance})}}{doubleblank}"
 
     return head_str
 
-def is_current(record,year):
+@lru_cache(maxsize=None)
+def parse_date(date_str):
+    """
+    Convert a date string from the spreadsheet into a datetime object.  The
+    same dates recur across many records, so each string is only parsed once.
+
+    inputs
+    ------
+    date_str : (str) a date in the format `date_fmt`
+
+    output
+    ------
+    a datetime object
     """
-    Utility function to check whether a record is valid for the current year.
-    Since records contain different information about dates, as appropriate,
-    there are multiple conditions that must be tested.
+
+    return datetime.strptime(date_str,date_fmt)
+
+def current_test(record,year):
+    """
+    Utility function to choose the test of whether a record is valid for the
+    current year.  Since records contain different information about dates, as
+    appropriate, there are multiple conditions that may be tested.
 
     a) if a record contains only a YEAR, it's value must match the given `year`
     b) if a record contains a STARTYEAR (and therefore an ENDYEAR), the given `year`
@@ -79,33 +164,31 @@ def is_current(record,year):
        must lie in the interval [STARTDATE, ENDDATE]
     d) if a record contains a DATE, the DATE must be in the given `year`
 
+    All the records of a worksheet have the same keys, so the test chosen for
+    one record applies to every record from that worksheet.  The years of the
+    dates are read from the fields added by `add_date_years()`.
+
     inputs
     ------
+    record : a record representative of the worksheet
     year : (int) year of interest to be matched
 
     output
     ------
-    Boolean per the above conditions
+    a function that returns a Boolean for a record per the above conditions
     """
 
-    if 'YEAR' in record.keys():
-        startyear = int(record['YEAR'])
-        endyear = startyear
-    elif 'STARTYEAR' in record.keys():
-        startyear = int(record['STARTYEAR'])
-        endyear = int(record['ENDYEAR'])
-    elif 'STARTDATE' in record.keys():
-        startyear = datetime.strptime(record['STARTDATE'],date_fmt).year
-        endyear = datetime.strptime(record['ENDDATE'],date_fmt).year
+    if 'YEAR' in record:
+        return lambda r: int(r['YEAR']) == year
+    elif 'STARTYEAR' in record:
+        return lambda r: int(r['STARTYEAR']) <= year <= int(r['ENDYEAR'])
+    elif 'STARTDATE' in record:
+        return lambda r: r['STARTDATEYEAR'] <= year <= r['ENDDATEYEAR']
     # check for DATE last because some records (e.g. proposals) contain DATE and STARTDATE
-    elif 'DATE' in record.keys():
-        startyear = datetime.strptime(record['DATE'],date_fmt).year
-        endyear = startyear
+    elif 'DATE' in record:
+        return lambda r: r['DATEYEAR'] == year
     else:
-        startyear = 9999
-        endyear = 0
-
-    return (startyear <= year and endyear >= year)
+        return lambda r: False
 
 def make_date_range(record):
     """
@@ -121,20 +204,112 @@ def make_date_range(record):
     A LaTeX formatted string representing the date range of the record
 
     """
-    start_date_obj = datetime.strptime(record['STARTDATE'],date_fmt)
-    end_date_obj = datetime.strptime(record['ENDDATE'],date_fmt)
+    start = parse_date(record['STARTDATE'])
+    end = parse_date(record['ENDDATE'])
+
+    return f"{start.month:02d}/{start.day:02d}-{end.month:02d}/{end.day:02d}"
+
+def records_from_values(values):
+    """
+    Utility function to convert the raw cell values of a worksheet into a list
+    of records in the same way as gspread's `get_all_records()`: the first row
+    supplies the keys, empty cells become "" and numeric strings become numbers.
+
+    inputs
+    ------
+    values : a list of rows, each a list of cell strings, as returned by the
+             Google Sheets API
+
+    output
+    ------
+    a list of records, one dictionary per row after the header
+    """
+
+    if len(values) == 0:
+        return []
+
+    # imported here so that the report builders can be used without gspread
+    from gspread.utils import numericise_all
+
+    header = values[0]
+    num_cols = len(header)
+
+    # the API omits trailing empty cells, so pad each row out to the header
+    return [dict(zip(header, numericise_all(row + [""] * (num_cols - len(row)))))
+            for row in values[1:]]
+
+def add_date_years(records):
+    """
+    Utility function to add the year of each date that `current_test()` will
+    check to every record of a worksheet, so that the dates are parsed once
+    when the worksheet is loaded rather than every time it is filtered.  The
+    year of a STARTDATE, ENDDATE or DATE is added as STARTDATEYEAR, ENDDATEYEAR
+    or DATEYEAR, respectively.
+
+    inputs
+    ------
+    records : a list of records from a Google sheets worksheet, updated in place
+    """
+
+    if len(records) == 0:
+        return
+
+    # follow the same precedence as current_test()
+    sample = records[0]
+    if 'YEAR' in sample or 'STARTYEAR' in sample:
+        return
+    elif 'STARTDATE' in sample:
+        date_keys = ('STARTDATE', 'ENDDATE')
+    elif 'DATE' in sample:
+        date_keys = ('DATE',)
+    else:
+        return
+
+    for record in records:
+        for key in date_keys:
+            record[key + 'YEAR'] = parse_date(record[key]).year
+
+def load_sheets(book, tabs):
+    """
+    Fetch the records from all the given worksheets with a single batched
+    request to the Google Sheets API.  The years of the dates used to test for
+    currency are added to each record by `add_date_years()`, and the records of
+    each worksheet in `catalog_worksheets` are indexed by their code, ready for
+    `apply_index()`.
+
+    inputs
+    ------
+    book : a google workbook object
+    tabs : a list of worksheet titles
+
+    output
+    ------
+    a dictionary of the records in each worksheet, keyed by worksheet title
+    """
+
+    value_ranges = book.values_batch_get(tabs)['valueRanges']
+
+    sheets = {tab : records_from_values(value_range.get('values', []))
+              for tab, value_range in zip(tabs, value_ranges)}
 
-    return start_date_obj.strftime("%m/%d") + "-" + end_date_obj.strftime("%m/%d")
+    for records in sheets.values():
+        add_date_years(records)
 
-def filter_for_current(worksheet,year):
+    for tab, join_key in catalog_worksheets.items():
+        if tab in sheets:
+            sheets[tab] = build_index(sheets[tab], join_key)
+
+    return sheets
+
+def filter_for_current(records,year):
     """
     Utility function to extract all the records from a given worksheet that 
-    are valid for the current year, as defined by the `is_current()` method.
+    are valid for the current year, as defined by the `current_test()` method.
 
     inputs
     ------
-    worksheet : a Google sheets worksheet object
-    year      : the year to test for currency
+    records : a list of records from a Google sheets worksheet
+    year    : the year to test for currency
 
 
     output
@@ -142,13 +317,19 @@ def filter_for_current(worksheet,year):
     a list of records that are current
     """
     
-    return [s for s in worksheet.get_all_records() if is_current(s,year)]
+    if len(records) == 0:
+        return []
+
+    is_current = current_test(records[0],year)
 
+    return [s for s in records if is_current(s)]
+
+@lru_cache(maxsize=None)
 def build_table_header(col_info):
     """
     Utility function to start a LaTeX table with some set of headings.
 
-    The format information is passed in a list of tuples, with one tuple for
+    The format information is passed in a tuple of tuples, with one tuple for
     each column, in order.  Each tuple contains 
     * a string for the header, 
     * a float for the relative width of the column
@@ -156,7 +337,8 @@ def build_table_header(col_info):
 
     inputs
     ------
-    col_info : a list of tuples for each 
+    col_info : a tuple of tuples, one for each column; being hashable lets
+               the header for each table layout be built only once
 
     output
     ------
@@ -164,14 +346,11 @@ def build_table_header(col_info):
 
     """
     
-    col_widths = [("p{" + str(frac) + "\\textwidth}|") for (head,frac,key) in col_info]
-    col_heads = [("\\textbf{" + head + "}") for (head,frac,key) in col_info]
-    header =  "\\begin{centering}\n" + \
-              "\\begin{tabular}" + \
-              "{|" + "".join(col_widths)  + "}" + \
-              "\\hline\n" +  " & ".join(col_heads) + table_double_rule + " \n"
+    col_widths = "".join(f"p{{{frac}\\textwidth}}|" for (head,frac,key) in col_info)
+    col_heads = " & ".join(f"\\textbf{{{head}}}" for (head,frac,key) in col_info)
 
-    return header
+    return (f"\\begin{{centering}}\n\\begin{{tabular}}{{|{col_widths}}}\\hline\n"
+            f"{col_heads}{table_double_rule} \n")
 
 def build_table_rows(record_list,col_info):
     """
@@ -185,7 +364,7 @@ def build_table_rows(record_list,col_info):
                   dictionary match the keys in the col_info to ensure that
                   each item goes in the correct column
 
-    col_info : a list of tuples.
+    col_info : a tuple of tuples.
 
                Each tuple represents one column.  The last entry in each tuple
                is a key that matches one of the columns in the original 
@@ -198,10 +377,17 @@ def build_table_rows(record_list,col_info):
 
     """
 
-    rows_str = ""
-    for r in record_list:
-        rows_str += " & ".join([str(r[key]) for (head,frac,key) in col_info]) + table_single_rule + "\n"
-    return rows_str + table_footer
+    keys = tuple(key for (head,frac,key) in col_info)
+
+    # itemgetter returns a bare value rather than a tuple for a single key
+    if len(keys) > 1:
+        row_values = itemgetter(*keys)
+    else:
+        row_values = lambda r: (r[keys[0]],)
+
+    rows = [" & ".join(map(str, row_values(r))) + table_single_rule + "\n"
+            for r in record_list]
+    return "".join(rows) + table_footer
 
 def build_table_or_none(row_data, column_info):
     """
@@ -217,7 +403,7 @@ def build_table_or_none(row_data, column_info):
                   dictionary match the keys in the col_info to ensure that
                   each item goes in the correct column
 
-    column_info : a list of tuples.
+    column_info : a tuple of tuples.
 
                Each tuple represents one column.  The last entry in each tuple
                is a key that matches one of the columns in the original 
@@ -266,43 +452,52 @@ def build_itemlist_or_none(list_data):
 
 
 
-def expand_table(table,cat_table,join_key):
+def build_index(cat_table,join_key):
     """
-    Utility function to add columns to one table based on the shared `join_key`
-    with another table for every row in `table` add all the columns 
-    from `cat_table` from the row with matching `join_key`
+    Utility function to create a dictionary that maps the value of `join_key`
+    for each record onto that full record, for use with `apply_index()`
 
     inputs
     ------
-
-    table : a list of dictionaries, each with one key equal to `join_key`
     cat_table : a list of dictionaries, each with one key equal to `join_key`
-    join_key : a key that appears in all dictionaries of each table
+    join_key : a key that appears in all dictionaries of the table
 
     outputs
     -------
-    a list of dictionaries, each with all the entries of both original dictionaries
+    a dictionary of records keyed by their value of `join_key`
+    """
+
+    return {e[join_key] : e for e in cat_table}
 
+def apply_index(table,index,join_key):
     """
+    Utility function to add columns to every row in `table` from the record
+    in `index` with the matching value of `join_key`.  Rows without a match
+    in `index` are kept without any additional columns.
 
-    # create a dictionary that maps the value of `join_key` for each record
-    # onto that full record
-    catalog = {e[join_key] : e for e in cat_table}
+    inputs
+    ------
+    table : a list of dictionaries, each with one key equal to `join_key`
+    index : a dictionary of records, as returned by `build_index()`
+    join_key : a key that appears in all dictionaries of `table`
 
-    # update each dictionary in `table` with the data from `cat_table`
-    # with the matching value of `join_key`
-    for e in table:
-        e.update(catalog[e[join_key]])
+    outputs
+    -------
+    a list of new dictionaries, each with all the entries of both original
+    dictionaries; the dictionaries in `table` are left unchanged
+    """
+
+    no_match = {}
 
-    return table
+    return [{**e, **index.get(e[join_key],no_match)} for e in table]
 
-def get_course_list(book,year):
+def get_course_list(sheets,year):
     """
     Build a table with the list of courses.
     
     inputs
     ------
-    book : a google sheet workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year
 
     output
@@ -312,16 +507,10 @@ def get_course_list(book,year):
     """
 
     # get all course history
-    full_history = book.worksheet('CourseHistory').get_all_records()
-
-    # map the database column names to the LaTeX table headers and widths
-    column_info = [("Semester",0.25,''),
-                   ("Course",0.25,'COURSEID'),
-                   ("\# of Students",0.25,'STUDENTS'),
-                   ("Role",0.25,'ROLE')]
+    full_history = sheets['CourseHistory']
 
     # Start with the heading & table heading
-    course_list_header = heading("Courses Taught") + build_table_header(column_info)
+    course_list_header = heading("Courses Taught") + build_table_header(course_column_info)
 
     # a LaTeX table separator within each semester
     part_rule  = " \\\\ \cline{2-4}"
@@ -329,61 +518,70 @@ def get_course_list(book,year):
     # an entry to use in every semester with no teaching
     empty_semester = "\multicolumn{3}{c|}{" + emph_none + "} " + table_double_rule
 
-    course_list_str = ""
+    semester_strs = []
+
+    # extract necessary data from this year's courses, grouped by semester
+    course_values = itemgetter('COURSEID','STUDENTS','ROLE')
+    semester_courses = defaultdict(list)
+    for e in full_history:
+        if e['YEAR'] == year:
+            semester_courses[e['SEMESTER']].append(tuple(map(str, course_values(e))))
 
     # loop through semesters in the order in which they occur in a
     # calendar year    
     for semester in ['Spring','Summer','Fall']:
-        # extract necessary data from this semester's list of courses
-        course_list = [ (e['COURSEID'],str(e['STUDENTS']),e['ROLE']) for e in full_history if (e['YEAR'],e['SEMESTER']) == (year,semester)]
+        course_list = semester_courses[semester]
 
         # special formatting for multirow with semester heading
         if (len(course_list) > 0):
             first_col = "\multirow{" + str(len(course_list)) + "}{*}{" + semester + "} \n    & "
             rows = [" & ".join(entry) for entry in course_list]
-            course_list_str += first_col + (part_rule + "\n    & ").join(rows) + table_double_rule + "\n"
+            semester_strs.append(first_col + (part_rule + "\n    & ").join(rows) + table_double_rule + "\n")
         else:
-            course_list_str += semester + " & " + empty_semester + "\n"
+            semester_strs.append(semester + " & " + empty_semester + "\n")
 
-    return course_list_header + course_list_str + table_footer
+    return course_list_header + "".join(semester_strs) + table_footer
 
 # info about future course interests
-def get_future_courses(book):
+def get_future_courses(sheets):
     """
     Provide list of future courses interest in three groupings.
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
 
     output
     ------
     LaTeX formatted list of courses in three groupings.
     """
     
-    all_courses = book.worksheet('CourseInfo').get_all_records()
-
-    future_course_str = heading("Course Interest for Future","")
+    all_courses = sheets['CourseInfo']
 
     status_strings = {'PREP':'Courses I am prepared to teach',
                       'REPEAT':'Courses I have taught and could teach again',
                       'INTEREST':'Courses I am interested in but not prepared to teach'}
 
+    status_courses = defaultdict(list)
+    for c in all_courses:
+        status_courses[c['PREPSTATUS']].append(c['COURSEID'])
+
+    future_course_strs = [heading("Course Interest for Future","")]
     for status in ['PREP','REPEAT','INTEREST']:
-        future_course_str += status_strings[status] + ": " + \
-                             ", ".join([c['COURSEID'] for c in all_courses if c['PREPSTATUS'] == status]) + \
-                             newline
+        future_course_strs.append(status_strings[status] + ": " + \
+                                  ", ".join(status_courses[status]) + \
+                                  newline)
         
-    return future_course_str
+    return "".join(future_course_strs)
 
 
-def get_student_advising_info(book,year):
+def get_student_advising_info(sheets,year):
     """
     Read through lists of advisees to determine number of advisees at each stage.
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year to extract
 
     output
@@ -395,34 +593,38 @@ def get_student_advising_info(book,year):
     """
 
     # Student advisees
-    current_advisees = filter_for_current(book.worksheet('AdviseeList'), year)
+    current_advisees = filter_for_current(sheets['AdviseeList'], year)
     
+    # count advisees of each type in each program in a single pass
+    advisee_counts = Counter((s['TYPE'],s['PROGRAM']) for s in current_advisees)
+
     adv_str_list = []
 
-    num_ne_ugrads = len([s for s in current_advisees if (s['TYPE'],s['PROGRAM']) == ("U","NE")])
+    num_ne_ugrads = advisee_counts[("U","NE")]
     if num_ne_ugrads > 0:
         adv_str_list.append(str(num_ne_ugrads) + " NE undergraduates")
 
-    num_neep_grads = len([s for s in current_advisees if (s['TYPE'],s['PROGRAM']) == ("G","NEEP")])
+    num_neep_grads = advisee_counts[("G","NEEP")]
     if num_neep_grads > 0:
         adv_str_list.append(str(num_neep_grads) + " NEEP graduate students")
         
-    other_grads = [s for s in current_advisees if (s['TYPE'] == "G" and s['PROGRAM'] != "NEEP")]
-    num_other_grads = len(other_grads)
+    other_grads = {program : num for (adv_type,program),num in advisee_counts.items()
+                   if (adv_type == "G" and program != "NEEP")}
+    num_other_grads = sum(other_grads.values())
     if num_other_grads > 0:
-        other_grad_majors = {s['PROGRAM'] for s in other_grads}
-        other_grad_string = " other graduate student(s) (" + ", ".join(other_grad_majors) + ")"
+        # programs are listed in the order they first appear among the advisees
+        other_grad_string = " other graduate student(s) (" + ", ".join(other_grads) + ")"
         adv_str_list.append(str(num_other_grads) + other_grad_string)
 
     return build_itemlist_or_none(adv_str_list)
 
-def get_org_advising_info(book,year):
+def get_org_advising_info(sheets,year):
     """
     Information about advising student organizations
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year to extract
 
     output
@@ -430,24 +632,24 @@ def get_org_advising_info(book,year):
     A string that indicates which student orgs are advised and the time commitment.
     """
     
-    current_orgs = expand_table(filter_for_current(book.worksheet('StudentOrgAdvising'),year),
-                                book.worksheet('StudentOrgList').get_all_records(),
-                                'ORGCODE')
+    current_orgs = apply_index(filter_for_current(sheets['StudentOrgAdvising'],year),
+                               sheets['StudentOrgList'],
+                               'ORGCODE')
     if (len(current_orgs) > 0):
         advising_str = "Faculty advisor for the " + \
-                       ", ".join([(o['ORGNAME'] + " (" + str(o['WEEKLYHOURS']) + " hours/wk)") for o in current_orgs])
+                       ", ".join([f"{o['ORGNAME']} ({o['WEEKLYHOURS']} hours/wk)" for o in current_orgs])
     else:
         advising_str = "Student Organizations: " + emph_none + doubleblank
         
     return advising_str
 
-def get_advising_info(book,year):
+def get_advising_info(sheets,year):
     """
     Create a report section with both individual advisee counts and student org advising.
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year to extract
 
     output
@@ -457,8 +659,8 @@ def get_advising_info(book,year):
     
     advising_str = heading("Advising Responsibilities")
 
-    advising_str += get_student_advising_info(book,year) + "\n" + \
-                    get_org_advising_info(book,year)
+    advising_str += get_student_advising_info(sheets,year) + "\n" + \
+                    get_org_advising_info(sheets,year)
     
     return advising_str
 
@@ -482,24 +684,27 @@ def committee_list(services):
                 ("YEAR", " hrs/yr"),
                 ("COUNT", "")]
 
+    unit_services = defaultdict(list)
+    for s in services:
+        unit_services[s['COMMITMENTUNIT']].append(s)
+
     commit_str_list = []
     # list in order of weekly, monthly, semesterly, annually
     for time_key, time_str in timeunit:
-        for svc in [s for s in services if s['COMMITMENTUNIT'] == time_key]:
-            commit_str_list.append(svc['NAME'] + " (" + str(svc['COMMITMENTQUANTITY']) + \
-                                   time_str + ")")
+        for svc in unit_services[time_key]:
+            commit_str_list.append(f"{svc['NAME']} ({svc['COMMITMENTQUANTITY']}{time_str})")
 
     return build_itemlist_or_none(commit_str_list)
 
-def soc_svc(services,society):
+def soc_svc(services,name):
     """
     Create a string by expanding the service obligations to a specific society 
     and sorting them from shortest frequency unit to longest.
 
     inputs
     ------
-    services : a list of record for service obligations
-    society : a string indicating which professional society
+    services : a list of record for service obligations within this society
+    name : the full name of the professional society
 
     output
     ------
@@ -507,24 +712,22 @@ def soc_svc(services,society):
     for each service obligation within that society.
     """
 
-    name = [svc['NAME'] for svc in services if svc['SERVICECODE'] == society]
-    
-    cat_svc_str = "\subsubsection{" + name[0] + "}" + doubleblank
+    cat_svc_str = "\subsubsection{" + name + "}" + doubleblank
 
-    cat_svc_str += committee_list([s for s in services if s['SOCIETY'] == society])
+    cat_svc_str += committee_list(services)
 
     return cat_svc_str
 
 # get the formatted version of each different category of service
-def get_service_cat(services,cat,cat_str):
+def get_service_cat(cat_svc,cat,cat_str):
     """
     Create a summary of the service obligations for a single category of service.
 
     inputs
     ------
 
-    services : a list of records for service obligations
-    cat      : the category key to extract for this block
+    cat_svc  : a list of records for service obligations in this category
+    cat      : the category key for this block
     cat_str  : the long text description of this category
 
     output
@@ -533,29 +736,39 @@ def get_service_cat(services,cat,cat_str):
     for each service obligation within that category.
 
     """
-    cat_svc = [s for s in services if s['CATEGORY'] == cat]
-    
-    cat_svc_str = "\subsection{To " + cat_str + "}\n\n"
+
+    cat_svc_strs = ["\subsection{To " + cat_str + "}\n\n"]
 
     if (len(cat_svc) > 0):
         if (cat != "SOCIETY"):
-            cat_svc_str += committee_list(cat_svc)
+            cat_svc_strs.append(committee_list(cat_svc))
         else:
-            for soc in {s['SOCIETY'] for s in cat_svc if s['SOCIETY'] != ""}:
-                cat_svc_str += soc_svc(cat_svc,soc)
+            # the parent societies are in this category too, so a single pass
+            # finds the name of each society and groups the services within it
+            soc_names = {}
+            soc_services = defaultdict(list)
+            for s in cat_svc:
+                soc_names[s['SERVICECODE']] = s['NAME']
+                if s['SOCIETY'] != "":
+                    soc_services[s['SOCIETY']].append(s)
+
+            for soc in soc_services:
+                cat_svc_strs.append(soc_svc(soc_services[soc],soc_names[soc]))
     else:
-        cat_svc_str += emph_none + doubleblank
+        cat_svc_strs.append(emph_none + doubleblank)
 
-    return cat_svc_str + doubleblank
+    cat_svc_strs.append(doubleblank)
+
+    return "".join(cat_svc_strs)
 
 # get formatted list of reviews
-def get_reviews(book,year):
+def get_reviews(sheets,year):
     """
     Create a string to summarize proposal and paper reviews
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year to extract
 
     output
@@ -564,32 +777,34 @@ def get_reviews(book,year):
     of the number of proposals for each source.
     """
 
-    current_reviews = filter_for_current(book.worksheet('Reviews'),year)
-    review_catalog = book.worksheet('ReviewSource').get_all_records()
-
-    current_reviews = expand_table(current_reviews,review_catalog,"SOURCE")
+    current_reviews = filter_for_current(sheets['Reviews'],year)
+    current_reviews = apply_index(current_reviews,sheets['ReviewSource'],"SOURCE")
 
     review_types = [('PAPER','Paper Reviews for Technical Journals and Conferences'),
                     ('PROPOSAL','Proposal Reviews')]
     
+    type_reviews = defaultdict(list)
+    for s in current_reviews:
+        type_reviews[s['REVIEWTYPE']].append(s)
+
     review_strs = []
     for r_type,r_type_str in review_types:
-        reviews = [s for s in current_reviews if s['REVIEWTYPE'] == r_type]
+        reviews = type_reviews[r_type]
         if len(reviews) > 0:
             review_strs.append("\subsection{" + r_type_str + "}")
-            review_str_list = [(r['NAME'] + " (" + str(r['NUMBER']) + ") ") for r in reviews]
+            review_str_list = [f"{r['NAME']} ({r['NUMBER']}) " for r in reviews]
             review_strs.append(", ".join(review_str_list))
                                
     return doubleblank.join(review_strs)
 
-def other_student_committees(book,year):
+def other_student_committees(sheets,year):
     """
     Create table entries that contain correct information for a service commitment
     based on the participation in student BS/MS/PhD committees
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year to extract
 
     output
@@ -601,15 +816,20 @@ def other_student_committees(book,year):
     """
 
     # get list of other student committees for this year
-    other_comms = filter_for_current(book.worksheet('OtherStudentCommittees'),year)
+    other_comms = filter_for_current(sheets['OtherStudentCommittees'],year)
 
     # set of possible committees
     comm_type_list = ["BS Defense", "MS Oral", "MS Defense", "PhD Prelim", "PhD Defense"]
 
+    # names of students on each type of committee in each organization
+    comm_names = defaultdict(list)
+    for s in other_comms:
+        comm_names[(s['TYPE'],s['DEPT'])].append(s['NAME'])
+
     comm_summary_list = []
     for comm_type in comm_type_list:
         for cat in ["EP","UW","NATIONAL"]:
-            name_list = [s['NAME'] for s in other_comms if (s['TYPE'],s['DEPT']) == (comm_type,cat)]
+            name_list = comm_names[(comm_type,cat)]
             if len(name_list) > 0:
                 comm_summary_list.append({'CATEGORY': cat,
                                           'NAME': comm_type + " committees (" + ", ".join(name_list) + ")",
@@ -620,13 +840,13 @@ def other_student_committees(book,year):
     
 
 # get all service obligations
-def get_service(book,year):
+def get_service(sheets,year):
     """
     Create a section with all service obligations
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year to extract
 
     output
@@ -636,41 +856,44 @@ def get_service(book,year):
 
     """
 
-    current_services = filter_for_current(book.worksheet('Service'),year)
-    service_catalog = book.worksheet('ServiceList').get_all_records()
+    current_services = filter_for_current(sheets['Service'],year)
+    service_catalog = sheets['ServiceList']
 
-    current_services = expand_table(current_services, service_catalog, "SERVICECODE")
+    current_services = apply_index(current_services, service_catalog, "SERVICECODE")
 
     # find all the parent societies and insert them in the service list
     parent_societies = {s['SOCIETY'] for s in current_services if (s['SOCIETY'] != "")}
-    current_services.extend([s for s in service_catalog if (s['SERVICECODE'] in parent_societies)])
+    current_services.extend([service_catalog[soc] for soc in parent_societies if soc in service_catalog])
 
     # append service list with summaries of student committees
-    current_services.extend(other_student_committees(book,year))
+    current_services.extend(other_student_committees(sheets,year))
     
-    service_str = heading("Service")
-
     service_cat_list = [("EP", "the Engineering Physics Department"),
                         ("COE", "the College of Engineering"),
                         ("UW", "the UW Campus and State of Wisconsin"),
                         ("NATIONAL", "National Groups and Other Universities/Institutions"),
                         ("SOCIETY", "Professional Societies")]
     
+    cat_services = defaultdict(list)
+    for s in current_services:
+        cat_services[s['CATEGORY']].append(s)
+
+    service_strs = [heading("Service")]
     for (cat,cat_str) in service_cat_list:
-        service_str += get_service_cat(current_services, cat, cat_str)
+        service_strs.append(get_service_cat(cat_services[cat], cat, cat_str))
 
-    service_str += get_reviews(book,year)
+    service_strs.append(get_reviews(sheets,year))
     
-    return service_str
+    return "".join(service_strs)
 
 # get outreach
-def get_outreach(book,year):
+def get_outreach(sheets,year):
     """
     Create a section with outreach experiences
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year to extract
 
     output
@@ -679,24 +902,24 @@ def get_outreach(book,year):
 
     """
 
-    current_outreach = filter_for_current(book.worksheet('Outreach'),year)
+    current_outreach = filter_for_current(sheets['Outreach'],year)
 
     outreach_strs = []
     for outreach in current_outreach:
-        date_obj = datetime.strptime(outreach['DATE'],date_fmt)
-        outreach_strs.append("\\textbf{"  + datetime.strftime(date_obj,"%B") + " " + str(date_obj.day) +
-                             "}: " + outreach['AUDIENCE'] + ", ``" + outreach['TITLE'] + "''")
+        date_obj = parse_date(outreach['DATE'])
+        outreach_strs.append(f"\\textbf{{{month_names[date_obj.month-1]} {date_obj.day}}}: "
+                             f"{outreach['AUDIENCE']}, ``{outreach['TITLE']}''")
 
     return heading("Educational Outreach Activities") + build_itemlist_or_none(outreach_strs)
 
 
-def get_patents(book,year):
+def get_patents(sheets,year):
     """
     Create a section with all patents
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year to extract
 
     output
@@ -705,11 +928,12 @@ def get_patents(book,year):
 
     """
 
-    patent_list = filter_for_current(book.worksheet("Patents"),year)
+    patent_list = filter_for_current(sheets["Patents"],year)
 
-    patent_str = heading("Patents applied for or granted in " + str(year))
+    patent_str = heading(f"Patents applied for or granted in {year}")
 
-    patent_str_list = ["Patent No. %(PATENTNUMBER) : %(TITLE) (%(STATUS))" % p for p in patent_list]
+    patent_str_list = [f"Patent No. {p['PATENTNUMBER']} : {p['TITLE']} ({p['STATUS']})"
+                       for p in patent_list]
 
     patent_str += build_itemlist_or_none(patent_str_list)
 
@@ -730,19 +954,17 @@ def make_grant_list(grants):
 
     """
 
-    # layout the columns
-   
-    grants_str = build_table_or_none(grants,column_info)
+    grants_str = build_table_or_none(grants, grantlist_column_info)
 
     return grants_str
 
-def get_proposal_submissions(book,year):
+def get_proposal_submissions(sheets,year):
     """
     Create a table for grant submissions during the year of interest
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year to extract
 
     output
@@ -750,28 +972,21 @@ def get_proposal_submissions(book,year):
     A LaTeX formatted string with a table of grant proposal information.
     """
 
-    submission_list = filter_for_current(book.worksheet('ProposalsAndGrants'), year)
+    submission_list = filter_for_current(sheets['ProposalsAndGrants'], year)
 
-    submission_list_str = heading("Research proposals submitted during " + str(year))
+    submission_list_str = heading(f"Research proposals submitted during {year}")
 
     submission_list_str += build_table_or_none(submission_list, grantlist_column_info)
 
     return submission_list_str
 
-def active_grant(grant_record,year):
-
-    begin_date_obj = datetime.strptime(grant_record['STARTDATE'],date_fmt)
-    end_date_obj = datetime.strptime(grant_record['ENDDATE'],date_fmt)
-    return begin_date_obj.year <= year and end_date_obj.year >= year
-    
-
-def get_active_grants(book,year):
+def get_active_grants(sheets,year):
     """
     Create a table for grant submissions during the year of interest
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year to extract
 
     output
@@ -779,23 +994,25 @@ def get_active_grants(book,year):
     A LaTeX formatted string with a table of active grant information.
     """
 
-    grant_list = book.worksheet('ProposalsAndGrants').get_all_records()
+    grant_list = sheets['ProposalsAndGrants']
 
-    active_grant_list = [g for g in grant_list if g['STATUS'] == 'FUNDED' and active_grant(g,year)]
+    # funded grants whose period of performance includes this year
+    active_grant_list = [g for g in grant_list if g['STATUS'] == 'FUNDED' and
+                         parse_date(g['STARTDATE']).year <= year <= parse_date(g['ENDDATE']).year]
 
-    active_grant_list_str = heading("Research grants and contracts active during " + str(year))
+    active_grant_list_str = heading(f"Research grants and contracts active during {year}")
     
     active_grant_list_str += build_table_or_none(active_grant_list, grantlist_column_info)
 
     return active_grant_list_str
     
-def get_consulting(book,year):
+def get_consulting(sheets,year):
     """
     Create a list of consulting engagements
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year to extract
 
     output
@@ -803,23 +1020,23 @@ def get_consulting(book,year):
     A LaTeX formatted string with one line for each consulting arrangement.
     """
 
-    consult_list = filter_for_current(book.worksheet("Consulting"),year)
+    consult_list = filter_for_current(sheets["Consulting"],year)
 
-    consulting_str = heading("Consulting agreements held in " + str(year))
+    consulting_str = heading(f"Consulting agreements held in {year}")
 
-    consulting_str_list = [("\\textbf{" + c['ORGANIZATION'] + ":}" + c['TOPIC']) for c in consult_list]
+    consulting_str_list = [f"\\textbf{{{c['ORGANIZATION']}:}}{c['TOPIC']}" for c in consult_list]
 
     consulting_str += build_itemlist_or_none(consulting_str_list)
 
     return consulting_str
 
-def get_meetings(book,year):
+def get_meetings(sheets,year):
     """
     Create a list of meetings that were attended
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year to extract
 
     output
@@ -827,52 +1044,72 @@ def get_meetings(book,year):
     A LaTeX formatted table with one row per meeting
     """
  
-    meeting_list = filter_for_current(book.worksheet("Meetings"),year)
+    meeting_list = filter_for_current(sheets["Meetings"],year)
 
     # extend the data with a formatted date range
     for meeting in meeting_list:
         meeting['DATERANGE'] = make_date_range(meeting)
     
-    column_info = [("Dates",0.15,'DATERANGE'),
-                   ("Location",0.2,'LOCATION'),
-                   ("Meeting",0.55,'MEETINGNAME')]
+    meeting_list_str = heading(f"Professional Meetings and Conferences Attended in {year}","")
 
-    meeting_list_str = heading("Professional Meetings and Conferences Attended in " + str(year),"")
-
-    meeting_list_str += build_table_or_none(meeting_list,column_info)
+    meeting_list_str += build_table_or_none(meeting_list, meeting_column_info)
 
     return meeting_list_str
 
-def get_current_grad_students(book,year):
+def get_research_students(sheets,year):
     """
-    Create a table with current grad students, their topic and funding
+    Join the current research students with their advisee records, add each
+    student's FULLNAME, and separate them into the current and the graduated
+    students.
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year to extract
 
     output
     ------
-    A LaTeX formatted table with one row per student
+    current_students : a list of records for current grad and visiting students
+    graduated_students : a list of records for grad students who graduated in `year`
     """
- 
-    all_current_students = filter_for_current(book.worksheet("ActiveResearchStudents"),year)
-    all_current_advisees = filter_for_current(book.worksheet("AdviseeList"),year)
 
-    grad_types = {"G", "V"}
-    research_student_list = expand_table( all_current_students,
-                                         [s for s in all_current_advisees if s['TYPE'] in grad_types],
-                                         'LASTNAME')
+    # only join graduate advising records, so that a student's earlier undergraduate
+    # record ending this year cannot shadow their current graduate record
+    grad_advisees = [a for a in filter_for_current(sheets["AdviseeList"],year)
+                     if a['TYPE'] in grad_student_types]
+    advisee_index = build_index(grad_advisees, 'LASTNAME')
+    research_student_list = apply_index(filter_for_current(sheets["ActiveResearchStudents"],year),
+                                        advisee_index, 'LASTNAME')
 
-    # extend record with full name to use standard table building capability
-    for student in research_student_list:
-        student['FULLNAME'] = student['FIRSTNAME'] + " " + student['LASTNAME']
+    current_students = []
+    graduated_students = []
+    for s in research_student_list:
+        # research students without a matching graduate advisee record have no
+        # advisee columns, and are skipped on purpose rather than reported
+        if 'TYPE' not in s:
+            continue
+        # extend record with full name to use standard table building capability
+        s['FULLNAME'] = f"{s['FIRSTNAME']} {s['LASTNAME']}"
+        if s['TYPE'] in grad_student_types:
+            current_students.append(s)
+        if (s['ENDYEAR'], s['TYPE']) == (year,"G"):
+            graduated_students.append(s)
+
+    return current_students, graduated_students
+
+def get_current_grad_students(research_student_list):
+    """
+    Create a table with current grad students, their topic and funding
+
+    inputs
+    ------
+    research_student_list : a list of records for current grad students,
+                            as returned by `get_research_students()`
 
-    column_info = [("Student",0.25,'FULLNAME'),
-                   ("Program",0.11,'DEGREE'),
-                   ("Research Topic",0.35,'TOPIC'),
-                   ("Source of Support",0.2,'SOURCE')]
+    output
+    ------
+    A LaTeX formatted table with one row per student
+    """
 
     # force this to start on a new page
     research_student_str = bind_page_start
@@ -881,125 +1118,126 @@ def get_current_grad_students(book,year):
                            "and non-thesis students who are active in research and " + \
                            "taking as much time as though doing there theses.")
 
-    research_student_str += build_table_or_none(research_student_list,column_info)
+    research_student_str += build_table_or_none(research_student_list, research_student_column_info)
 
     research_student_str += bind_page_end
     
     return research_student_str
 
-def get_graduated_students(book,year):
+def get_graduated_students(graduated_student_list,year):
     """
     Create a table with students who graduated in this time period.
 
     inputs
     ------
-    book : a google workbook object
+    graduated_student_list : a list of records for graduated students,
+                             as returned by `get_research_students()`
     year : the current year to extract
 
     output
     ------
     A LaTeX formatted table with one row per student who graduated
     """
- 
-    research_student_list = expand_table(filter_for_current(book.worksheet("ActiveResearchStudents"),year),
-                                         filter_for_current(book.worksheet("AdviseeList"),year),
-                                         'LASTNAME')
-    graduated_student_list = [s for s in research_student_list if (s['ENDYEAR'], s['TYPE']) == (year,"G")]
 
-    for student in graduated_student_list:
-        student['FULLNAME'] = student['FIRSTNAME'] + " " + student['LASTNAME']
-
-    column_info = [("Student",0.3,'FULLNAME'),
-                   ("Program",0.15,'DEGREE'),
-                   ("Date",0.15,'DEFENSEDATE'),
-                   ("Employer",0.3,'CURRENTEMPLOYER')]
-
-    graduated_student_str = heading("Graduate students who graduated in " + str(year),"")
+    graduated_student_str = heading(f"Graduate students who graduated in {year}","")
     
-    graduated_student_str += build_table_or_none(graduated_student_list, column_info)
+    graduated_student_str += build_table_or_none(graduated_student_list, graduated_student_column_info)
     
     return graduated_student_str
 
 
-def get_staff_list(book,year, staff_positions):
+def get_staff(sheets,year):
     """
-    Create a table with staff with a given set of titles
+    Separate the current staff into research staff and undergraduate researchers,
+    adding the FULLNAME of each.
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year to extract
-    staff_positions : a set of strings with valid titles to include in this table
 
     output
     ------
-    A LaTeX formatted table with one row per staff member
+    prof_list : a list of records for scientists, researchers and academic staff
+    ug_list : a list of records for undergraduate hourly researchers
     """
- 
-    staff_list = [s for s in filter_for_current(book.worksheet("Staff"),year) if s['TITLE'] in staff_positions]
 
-    for staff in staff_list:
-        staff['FULLNAME'] = staff['FIRSTNAME'] + " " + staff['LASTNAME']
+    prof_list = []
+    ug_list = []
+    for s in filter_for_current(sheets["Staff"],year):
+        if s['TITLE'] in prof_positions:
+            prof_list.append(s)
+        elif s['TITLE'] in ug_positions:
+            ug_list.append(s)
+        else:
+            continue
+        s['FULLNAME'] = f"{s['FIRSTNAME']} {s['LASTNAME']}"
+
+    return prof_list, ug_list
 
-    column_info = [("Name", 0.25,'FULLNAME'),
-                   ("Title",0.11,'TITLE'),
-                   ("Research Topic",0.35,'TOPIC'),
-                   ("Source of Support",0.2,'SUPPORT')]
-    
-    return build_table_or_none(staff_list, column_info)
+def get_staff_list(staff_list):
+    """
+    Create a table with a list of staff
 
-def get_prof_list(book, year):
+    inputs
+    ------
+    staff_list : a list of records for the staff to include in this table,
+                 as returned by `get_staff()`
+
+    output
+    ------
+    A LaTeX formatted table with one row per staff member
+    """
+
+    return build_table_or_none(staff_list, staff_column_info)
+
+def get_prof_list(prof_list, year):
     """
     Create a table of professional staff: Scientists, Researches, Academic Staff
 
     inputs
     ------
-    book : a google workbook object
+    prof_list : a list of records for research staff, as returned by `get_staff()`
     year : the current year to extract
 
     output
     ------
     A LaTeX formatted table with one row per staff member
     """
- 
-    staff_positions = {'Scientist','Researcher','Academic Staff'}
 
     prof_list_str = bind_page_start + heading("Research Staff",
-                    "Post-PhD and academic staff supervised in " + str(year))
+                    f"Post-PhD and academic staff supervised in {year}")
     
-    prof_list_str += get_staff_list(book, year, staff_positions)
+    prof_list_str += get_staff_list(prof_list)
     
     return prof_list_str + bind_page_end
 
-def get_ug_list(book,year):
+def get_ug_list(ug_list):
     """
     Create a table of undergraduate students
 
     inputs
     ------
-    book : a google workbook object
-    year : the current year to extract
+    ug_list : a list of records for undergraduate researchers, as returned by `get_staff()`
 
     output
     ------
     A LaTeX formatted table with one row per staff member
     """
- 
-    ug_positions = {'U/G Hourly'}
-  
+
     ug_list_str = heading("Undergraduate researchers")
 
-    ug_list_str += get_staff_list(book, year, ug_positions)
+    ug_list_str += get_staff_list(ug_list)
 
     return ug_list_str
 
-def get_narrative(book, year, tab, title, desc):
+def get_narrative(sheets, year, tab, title, desc):
     """
     Create a text list from a given spreadsheet tab composed of titles and descriptions
 
     inputs
     ------
-    book : a google workbook object
+    sheets : a dictionary of the records in each worksheet, keyed by title
     year : the current year to extract
 
     output
@@ -1007,7 +1245,7 @@ def get_narrative(book, year, tab, title, desc):
     A LaTeX formatted list wth one item per list
     """
  
-    item_list = filter_for_current(book.worksheet(tab),year)
+    item_list = filter_for_current(sheets[tab],year)
 
     item_str = heading(title, desc)
 
@@ -1023,130 +1261,178 @@ def build_publications():
     """
 
 
-    pub_str = heading("Publications list","")
+    pub_strs = [heading("Publications list","")]
 
     for section in ['journalssubmitted','journalsaccepted','journalspublished','conference','reports','books','invited']:
-        pub_str += "\\nocite{0}{{*}}\n".format(section)
-        pub_str += "\\bibliographystyle{0}{{ep_par.bst}}\n".format(section)
-        pub_str += "\\bibliography{0}{{{0}.bib}}\n\n".format(section)
+        pub_strs.append(f"\\nocite{section}{{*}}\n"
+                        f"\\bibliographystyle{section}{{ep_par.bst}}\n"
+                        f"\\bibliography{section}{{{section}.bib}}\n\n")
 
-    return pub_str
+    return "".join(pub_strs)
 
 
-def build_par(book,year):
+def build_par(sheets,year):
+    """
+    Generate the LaTeX source of the PAR, one piece at a time in document order.
 
-    par_tex = """\
-\documentclass[12pt]{article}
+    inputs
+    ------
+    sheets : a dictionary of the records in each worksheet, keyed by title
+    year : the current year to extract
 
-\\usepackage{ep_par}
-"""
-    
-    par_tex += "\\newcommand{\paryear}{" +  str(year) + "}\n"
-    par_tex += """\
-\\newcommand{\parperson}{Paul P.\ H.\ Wilson}
-\\begin{document}
+    output
+    ------
+    a generator of strings that together make up the LaTeX document
+    """
+
+    yield par_preamble
+    yield f"\\newcommand{{\\paryear}}{{{year}}}\n"
+    yield par_begin_document
+    current_students, graduated_students = get_research_students(sheets,year)
+    prof_list, ug_list = get_staff(sheets,year)
+
+    # each section is a separator title and a function that builds its LaTeX,
+    # called only when the section is reached so the output can be streamed
+    sections = [
+        ("Professional Summary", lambda: "\\input{professional_summary}\n"),
+        ("Course List", lambda: get_course_list(sheets,year)),
+        ("Course Prep", lambda: get_future_courses(sheets)),
+        ("Course Dev", lambda: get_narrative(sheets,year,"CourseDevelopment",
+                                             "Course Development Activities","")),
+        ("Student Advising", lambda: get_advising_info(sheets,year)),
+        ("Service", lambda: get_service(sheets,year)),
+        ("Educational Outreach Activities", lambda: get_outreach(sheets,year)),
+        ("Awards/Honors", lambda: get_narrative(sheets,year,"HonorsAwards",
+                                                f"Honors and Awards received in {year}","")),
+        ("Patents", lambda: get_patents(sheets,year)),
+        ("Submitted Proposals", lambda: get_proposal_submissions(sheets,year)),
+        ("Active Grants", lambda: get_active_grants(sheets,year)),
+        ("Consulting", lambda: get_consulting(sheets,year)),
+        ("Meetings", lambda: get_meetings(sheets,year)),
+        ("Current Grad Students", lambda: get_current_grad_students(current_students)),
+        ("Graduated Students", lambda: get_graduated_students(graduated_students,year)),
+        ("Staff", lambda: get_prof_list(prof_list,year)),
+        ("Undergrads", lambda: get_ug_list(ug_list)),
+        ("Personal Research", lambda: get_narrative(sheets,year,"PersonalResearch", "Personal Research",
+                                   "Brief description of the extent and nature of any personal research " + \
+                                   "(defined here as research performed independent of graduate students rather " + \
+                                   "than through them) and indicate the project on which this research is done.")),
+        ("Publications", build_publications),
+        ("Climate Improvement", lambda: get_narrative(sheets,year,"ClimateImprovement", "Climate Improvement Activities",
+                                   "Please comment on any ways that you have worked to enhance the climate " + \
+                                   "and culture of the department and/or college.  This may include " + \
+                                   "strategies to increase inclusivity in your courses, approaches to " + \
+                                   "maintain a healthy climate in your research group, activities that " + \
+                                   "contribute to a collaborative working environment with other faculty " + \
+                                   "and staff, and workshops/trainings on leadership, mentoring, recruiting, " + \
+                                   "or diversity.  If you have attended workshops/trainings on leadership, " + \
+                                   "mentoring, recruiting, or diversity, please list those and identify actions " +\
+                                   "you have taken as a result of what you learned.")),
+        ("Other Activities", lambda: get_narrative(sheets,year,"ImportantActivities", "Other Important Activities",
+                                   "Comment on any important activities not covered above.")),
+        ("Significant Accomplishments", lambda: get_narrative(sheets,year,"SignificantAccomplishments",
+                                   "Significant Accomplishments",
+                                   "Your own view of your most significant accomplishments during the past year")),
+        ]
+
+    for title, build_section in sections:
+        yield section_sep(title)
+        yield build_section() + "\n"
+
+    yield par_end_document
+
+
+def open_book(credentials,filename,key=None):
+
+    # the Google client is only needed to fetch a workbook, so defer its import
+    import gspread
 
-\partitle
-"""
-    par_tex += section_sep("Professional Summary")
-    par_tex += "\input{professional_summary}\n\n"
+    # use creds to create a client to interact with the Google Drive API
+    client = gspread.service_account(filename=credentials)
 
-    par_tex += section_sep("Course List")
-    par_tex += get_course_list(book,year) + "\n"
+    # Opening by key goes straight to the Sheets API, while opening by name
+    # first has to search Google Drive for a workbook with that name.
+    if key:
+        book = client.open_by_key(key)
+    else:
+        # Make sure you use the right name here.
+        book = client.open(filename)
 
-    par_tex += section_sep("Course Prep")
-    par_tex += get_future_courses(book) + "\n"
+    return book
 
-    par_tex += section_sep("Course Dev")
-    par_tex += get_narrative(book,year,"CourseDevelopment", "Course Development Activities","") + "\n"
+def cache_path(cache_dir, book, year):
+    """
+    Utility function to name the file that caches the report for a given year
+    from a given revision of the workbook, rendered by a given version of this
+    script.  Any edit to the workbook changes its last update time, and any edit
+    to this script changes its hash, so stale reports are never reused.
 
-    par_tex += section_sep("Student Advising")
-    par_tex += get_advising_info(book,year) + "\n"
-    
-    par_tex += section_sep("Service")
-    par_tex += get_service(book,year) + "\n"
-    
-    par_tex += section_sep("Educational Outreach Activities")
-    par_tex += get_outreach(book,year) + "\n"
-    
-    par_tex += section_sep("Awards/Honors")
-    par_tex += get_narrative(book,year,"HonorsAwards", "Honors and Awards received in " + str(year),"") + "\n"
+    inputs
+    ------
+    cache_dir : (str) directory holding the cached reports
+    book : a google workbook object
+    year : (int) year of the report
 
-    par_tex += section_sep("Patents")
-    par_tex += get_patents(book,year) + "\n"
+    output
+    ------
+    the path of the cache file for this report
+    """
 
-    par_tex += section_sep("Submitted Proposals")
-    par_tex += get_proposal_submissions(book,year) + "\n"
+    with open(__file__, "rb") as source:
+        source_hash = hashlib.sha256(source.read()).hexdigest()
 
-    par_tex += section_sep("Active Grants")
-    par_tex += get_active_grants(book,year) + "\n"
-    
-    par_tex += section_sep("Consulting")
-    par_tex += get_consulting(book,year) + "\n"
-    
-    par_tex += section_sep("Meetings")
-    par_tex += get_meetings(book,year) + "\n"
-    
-    par_tex += section_sep("Current Grad Students")
-    par_tex += get_current_grad_students(book,year) + "\n"
-    
-    par_tex += section_sep("Graduated Students")
-    par_tex += get_graduated_students(book,year) + "\n"
-    
-    par_tex += section_sep("Staff")
-    par_tex += get_prof_list(book,year) + "\n"
-    
-    par_tex += section_sep("Undergrads")
-    par_tex += get_ug_list(book,year) + "\n"
-    
-    par_tex += section_sep("Personal Research")
-    par_tex += get_narrative(book,year,"PersonalResearch", "Personal Research",
-                             "Brief description of the extent and nature of any personal research " + \
-                             "(defined here as research performed independent of graduate students rather " + \
-                             "than through them) and indicate the project on which this research is done.")+ "\n"
-
-    par_tex += section_sep("Publications")
-    par_tex += build_publications() + "\n"
-    
-    par_tex += section_sep("Climate Improvement")
-    par_tex += get_narrative(book,year,"ClimateImprovement", "Climate Improvement Activities",
-                             "Please comment on any ways that you have worked to enhance the climate " + \
-                             "and culture of the department and/or college.  This may include " + \
-                             "strategies to increase inclusivity in your courses, approaches to " + \
-                             "maintain a healthy climate in your research group, activities that " + \
-                             "contribute to a collaborative working environment with other faculty " + \
-                             "and staff, and workshops/trainings on leadership, mentoring, recruiting, " + \
-                             "or diversity.  If you have attended workshops/trainings on leadership, " + \
-                             "mentoring, recruiting, or diversity, please list those and identify actions " +\
-                             "you have taken as a result of what you learned.") + "\n"
-
-    par_tex += section_sep("Other Activities")
-    par_tex += get_narrative(book,year,"ImportantActivities", "Other Important Activities",
-                             "Comment on any important activities not covered above.") + "\n"
-
-    par_tex += section_sep("Significant Accomplishments")
-    par_tex += get_narrative(book,year,"SignificantAccomplishments","Significant Accomplishments",
-                    "Your own view of your most significant accomplishments during the past year") + "\n"
-    
-      
-    par_tex += "\end{document}\n"
+    key = hashlib.sha256(f"{year}:{book.id}:{book.get_lastUpdateTime()}:{source_hash}".encode()).hexdigest()
 
-    return par_tex
+    return os.path.join(cache_dir, key + ".tex")
 
+def build_cached_par(book, year, cache_dir):
+    """
+    Generate the LaTeX source of the PAR, reusing the report cached in
+    `cache_dir` if the workbook has not changed since it was built.  Otherwise
+    the worksheets are loaded and the report is built as usual, and saved to
+    the cache as it is generated.
 
-def open_book(credentials,filename):
+    inputs
+    ------
+    book : a google workbook object
+    year : the current year to extract
+    cache_dir : (str) directory holding the cached reports
 
-    # use creds to create a client to interact with the Google Drive API
-    client = gspread.service_account(filename=credentials)
+    output
+    ------
+    a generator of strings that together make up the LaTeX document
+    """
 
-    # Find a workbook by name and open the first sheet
-    # Make sure you use the right name here.
-    book = client.open(filename)
+    cache_file = cache_path(cache_dir, book, year)
 
-    return book
+    if os.path.exists(cache_file):
+        with open(cache_file) as cached:
+            yield cached.read()
+        return
 
+    os.makedirs(cache_dir, exist_ok=True)
 
-if __name__ == '__main__':
+    # write to a uniquely named temporary file so that concurrent runs don't
+    # collide, and a failed or abandoned run never leaves a partial report
+    partial = tempfile.NamedTemporaryFile("w", dir=cache_dir, suffix=".partial", delete=False)
+    try:
+        with partial:
+            for part in build_par(load_sheets(book, par_worksheets), year):
+                partial.write(part)
+                yield part
+        os.replace(partial.name, cache_file)
+    finally:
+        if os.path.exists(partial.name):
+            os.remove(partial.name)
+
+
+def main():
+    """
+    Read the command line options, load the workbook and write the report
+    to standard output.
+    """
+
+    import argparse
 
     parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
@@ -1158,9 +1444,25 @@ if __name__ == '__main__':
 
     parser.add_argument("-f", "--filename", type=str, default='PAR Data',
                         help="Name of Google Sheets file")
+
+    parser.add_argument("-k", "--key", type=str, default=None,
+                        help="Key of Google Sheets file (from its URL), used instead of the name")
+
+    parser.add_argument("--cache", type=str, default=None,
+                        help="Directory in which to cache reports, reused until the workbook changes")
                         
     args = parser.parse_args()
 
-    book = open_book(args.credentials, args.filename)
+    book = open_book(args.credentials, args.filename, args.key)
+
+    if args.cache:
+        sys.stdout.writelines(build_cached_par(book, args.year, args.cache))
+        return
+
+    sheets = load_sheets(book, par_worksheets)
     
-    print(build_par(book,args.year))
+    sys.stdout.writelines(build_par(sheets,args.year))
+
+
+if __name__ == '__main__':
+    main()